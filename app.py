@@ -1,25 +1,30 @@
 # app.py
 import os
 import re
+import sqlite3
+import tempfile
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 import numpy as np
-from datetime import datetime
 import streamlit as st
-import plotly.graph_objects as go
-import plotly.express as px
+from plotly.colors import qualitative
 import logging
 
-# Configure logging
+# Configure logging (niveau INFO par défaut, modifiable avec la variable LOGLEVEL) ;
+# basicConfig ne fait rien aux réexécutions suivantes, le logger racine ayant déjà un handler
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.environ.get('LOGLEVEL', 'INFO').upper(),
     format='%(asctime)s %(levelname)s:%(message)s',
     handlers=[
         logging.StreamHandler()
     ]
 )
 
-# Définir une palette de couleurs pastel pour les graphiques
-PASTEL_COLORS = px.colors.qualitative.Pastel
+# Définir une palette de couleurs pastel pour les graphiques (plotly.express et
+# plotly.graph_objects ne sont importés qu'à la construction du premier graphique)
+PASTEL_COLORS = qualitative.Pastel
 
 # Configuration de la page pour une meilleure esthétique
 st.set_page_config(
@@ -145,31 +150,116 @@ st.markdown("""
 
 # Définir le chemin du fichier de données
 csv_file = "final_data_utf8.csv"  # Utilisez le fichier converti en UTF-8
+# Base SQLite séparée pour les entrées infirmières (le CSV principal n'est plus réécrit)
+nurse_db_file = "nurse_inputs.db"
 
-# Fonction pour charger les données avec le bon encodage
+# Libellés d'affichage pour les codes de sexe et de grossesse (numériques ou textuels) ;
+# les codes '1.0'/'0.0' couvrent une colonne numérique lue en float à cause de valeurs manquantes
+sex_mapping = {'1': "Homme", '2': "Femme", '1.0': "Homme", '2.0': "Femme", 'H': "Homme", 'F': "Femme"}
+pregnant_mapping = {'1': "Oui", '0': "Non", '1.0': "Oui", '0.0': "Non", 'Oui': "Oui", 'Non': "Non"}
+
+# Copie Parquet du CSV : régénérée automatiquement dès que le CSV est plus récent
+parquet_file = "final_data.parquet"
+
+# Colonnes réellement utilisées par le tableau de bord (les autres ne sont pas lues)
+KEEP_COLS = {
+    'ID', 'age', 'sexe', 'comorbidities', 'pregnant', 'cigarette_bl', 'alcool_bl', 'cocaine_bl',
+    'annees_education_bl', 'revenu_bl', 'objectives', 'tasks', 'comments'
+}
+KEEP_PREFIXES = ('madrs', 'pid5_', 'phq9_')
+
+def keep_column(col):
+    return col in KEEP_COLS or col.startswith(KEEP_PREFIXES)
+
+# Types numériques appliqués une seule fois au chargement
+numeric_dtypes = {'age': 'Int16', 'annees_education_bl': 'Int16', 'revenu_bl': 'Int64'}
+categorical_cols = ('comorbidities', 'cigarette_bl', 'alcool_bl', 'cocaine_bl')
+
+# Fonction pour lire les données brutes : depuis la copie Parquet si elle est à jour,
+# sinon depuis le CSV (le fichier est en UTF-8 ; convertir au besoin une seule fois
+# au déploiement avec `iconv -f latin1 -t utf-8`), qui est alors converti en Parquet.
+# Seules les colonnes utiles (keep_column) sont lues, dans les deux cas.
+def read_source_data(csv_file):
+    # En-tête du CSV uniquement, pour connaître les colonnes utiles
+    columns = [c for c in pd.read_csv(csv_file, nrows=0, encoding='utf-8').columns if keep_column(c)]
+    try:
+        if (os.path.exists(parquet_file) and os.path.getmtime(parquet_file) >= os.path.getmtime(csv_file)
+                and set(columns).issubset(pq.read_schema(parquet_file).names)):
+            return pd.read_parquet(parquet_file, columns=columns)
+    except Exception as e:
+        logging.warning("Impossible de lire %s, lecture de %s : %s", parquet_file, csv_file, e)
+
+    # Lecteur CSV multithread de PyArrow, appelé directement : pd.read_csv(engine='pyarrow')
+    # ne permet pas d'activer newlines_in_values, indispensable pour les commentaires
+    # infirmiers sur plusieurs lignes dès que le fichier dépasse un bloc de lecture
+    data = pacsv.read_csv(
+        csv_file,
+        read_options=pacsv.ReadOptions(encoding='utf-8'),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=columns,
+            column_types={'ID': pa.string()},
+            strings_can_be_null=True
+        )
+    ).to_pandas()
+    # Copie Parquet écrite dans un fichier temporaire puis renommée : jamais de fichier à moitié
+    # écrit si deux sessions la créent en même temps. Si le dossier est en lecture seule,
+    # l'application continue simplement avec le CSV.
+    tmp_file = None
+    try:
+        fd, tmp_file = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(parquet_file)))
+        os.close(fd)
+        data.to_parquet(tmp_file, index=False, compression="zstd")
+        os.replace(tmp_file, parquet_file)
+        logging.debug("Copie Parquet créée : %s", parquet_file)
+    except (OSError, pa.ArrowException) as e:
+        logging.warning("Impossible d'écrire %s : %s", parquet_file, e)
+        if tmp_file and os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return data
+
+# Fonction pour charger les données
 @st.cache_data
 def load_data(csv_file):
     try:
-        data = pd.read_csv(csv_file, dtype={'ID': str}, encoding='utf-8')
-        logging.debug(f"Données chargées avec succès depuis {csv_file} avec 'utf-8'")
+        data = read_source_data(csv_file)
+        # Indexer par ID (en gardant la colonne) pour des recherches par hachage
+        data = data.set_index('ID', drop=False).sort_index()
+        # Convertir une seule fois les colonnes affichées pour éviter tout traitement au rendu
+        for col, dtype in numeric_dtypes.items():
+            if col in data.columns:
+                values = pd.to_numeric(data[col], errors='coerce')
+                try:
+                    # Arrondi avant la conversion : une valeur fractionnaire (ex. 45000.5) ferait
+                    # échouer la conversion en entier nullable
+                    data[col] = values.round().astype(dtype)
+                except (TypeError, ValueError, OverflowError) as e:
+                    # Une colonne hors limites ne doit pas vider tout le jeu de données
+                    logging.warning("Conversion de la colonne %s en %s impossible, valeurs conservées en flottants : %s", col, dtype, e)
+                    data[col] = values
+        # Scores MADRS/PID-5/PHQ-9 (petits entiers) en float32 : moitié moins de mémoire que float64
+        score_cols = [c for c in data.columns if c.startswith(KEEP_PREFIXES)]
+        data[score_cols] = data[score_cols].apply(pd.to_numeric, errors='coerce').astype('float32')
+        if 'sexe' in data.columns:
+            data['sexe'] = data['sexe'].astype(str).map(sex_mapping).fillna("Autre").astype('category')
+        if 'pregnant' in data.columns:
+            data['pregnant'] = data['pregnant'].astype(str).map(pregnant_mapping).fillna("N/A").astype('category')
+        # Colonnes cliniques textuelles à faible cardinalité : codes entiers plutôt que chaînes Python
+        for col in categorical_cols:
+            if col in data.columns:
+                data[col] = data[col].astype('category')
+        logging.debug("Données chargées avec succès depuis %s", csv_file)
         return data
-    except UnicodeDecodeError:
-        logging.warning(f"Erreur d'encodage avec 'utf-8'. Tentative de chargement avec 'latin1'.")
-        try:
-            data = pd.read_csv(csv_file, dtype={'ID': str}, encoding='latin1')
-            logging.debug(f"Données chargées avec succès depuis {csv_file} avec 'latin1'")
-            return data
-        except Exception as e:
-            logging.error(f"Erreur lors du chargement des données depuis {csv_file}: {e}")
-            return pd.DataFrame()
     except Exception as e:
-        logging.error(f"Erreur lors du chargement des données depuis {csv_file}: {e}")
+        logging.error("Erreur lors du chargement des données depuis %s: %s", csv_file, e)
         return pd.DataFrame()
 
 # Charger les données
 final_data = load_data(csv_file)
-logging.debug("Colonnes des données finales : %s", final_data.columns.tolist())
-logging.debug("Échantillon des données finales :\n%s", final_data.head())
+# Aperçu des données uniquement en mode DEBUG (évite de formater le DataFrame à chaque exécution)
+if logging.getLogger().isEnabledFor(logging.DEBUG):
+    logging.debug("Colonnes des données finales : %s", final_data.columns.tolist())
+    logging.debug("Échantillon des données finales :\n%s", final_data.head())
 
 # Vérifier que la colonne 'ID' existe et est unique et non vide
 if 'ID' not in final_data.columns:
@@ -207,14 +297,59 @@ pid5_dimensions_mapping = {
     'Psychoticisme': [7, 12, 21, 23, 24]
 }
 
+# Colonnes attendues pour les PID-5 et PHQ-9 (indépendantes des données)
+PID5_BL_COLS = {dim: [f'pid5_{item}_bl' for item in items] for dim, items in pid5_dimensions_mapping.items()}
+PID5_FU_COLS = {dim: [f'pid5_{item}_fu' for item in items] for dim, items in pid5_dimensions_mapping.items()}
+PHQ9_DAYS = [5, 10, 15, 20, 25, 30]
+PHQ9_DAY_COLS = {day: [f'phq9_day{day}_item{item}' for item in range(1, 10)] for day in PHQ9_DAYS}
+
+# Colonnes des items MADRS : madrs_<item>_<bl|fu> (ou séparées par des points)
+MADRS_ITEM_RE = re.compile(r'madrs[_.](\d+)[_.](bl|fu)$')
+
+# Analyse des colonnes disponibles, effectuée une seule fois par fichier de données
+# plutôt qu'à chaque réexécution du script
+@st.cache_resource
+def load_column_info(csv_file):
+    columns = list(load_data(csv_file).columns)
+    column_set = frozenset(columns)
+    # (colonne, numéro d'item, temps) pour chaque item MADRS
+    madrs_meta = [
+        (col, int(m.group(1)), m.group(2))
+        for col in columns
+        if (m := MADRS_ITEM_RE.match(col))
+    ]
+    pid5_cols = [col for cols in list(PID5_BL_COLS.values()) + list(PID5_FU_COLS.values()) for col in cols]
+    return {
+        "has_pid5": any(col[:5] == 'pid5_' for col in column_set),
+        "has_phq9": any(col[:5] == 'phq9_' for col in column_set),
+        "madrs_meta": madrs_meta,
+        "pid5_complete": column_set.issuperset(pid5_cols),
+        "phq9_complete": {day: column_set.issuperset(cols) for day, cols in PHQ9_DAY_COLS.items()},
+    }
+
+column_info = load_column_info(csv_file)
+
 # Vérifier la disponibilité des données PID-5 et PHQ-9
-has_pid5 = any(col.startswith('pid5_') for col in final_data.columns)
-has_phq9 = any(col.startswith('phq9_') for col in final_data.columns)
+has_pid5 = column_info["has_pid5"]
+has_phq9 = column_info["has_phq9"]
+MADRS_META = column_info["madrs_meta"]
+MADRS_ITEM_COLS = [col for col, _, _ in MADRS_META]
+HAS_PID5_ALL = column_info["pid5_complete"]
+HAS_PHQ9_ALL = all(column_info["phq9_complete"].values())
 
 # Fonction de tri sécurisée pour les IDs des patients
-def extract_number(id_str):
-    match = re.search(r'\d+', id_str)
-    return int(match.group()) if match else float('inf')
+ID_NUMBER_RE = re.compile(r'\d+')
+
+# La méthode de recherche est liée en argument par défaut (pas de recherche globale par appel)
+# et un entier sentinelle évite les comparaisons mixtes int/float pendant le tri
+def extract_number(id_str, _search=ID_NUMBER_RE.search):
+    match = _search(id_str)
+    return int(match.group()) if match else 1 << 62
+
+# Liste triée des IDs, calculée une seule fois par fichier de données
+@st.cache_data
+def sorted_patient_ids(csv_file):
+    return sorted(final_data.index.unique(), key=extract_number)
 
 # Mise en page de la barre latérale
 with st.sidebar:
@@ -225,57 +360,346 @@ with st.sidebar:
 
     st.markdown("---")
     st.header("Sélectionner un Patient")
-    patient_ids = sorted(final_data["ID"].unique(), key=extract_number) if not final_data.empty else []
+    patient_ids = sorted_patient_ids(csv_file) if not final_data.empty else []
     selected_patient_id = st.selectbox("Sélectionner l'ID du Patient", patient_ids) if patient_ids else None
 
     # Afficher le nombre de patients chargés pour débogage
     st.write(f"Nombre de patients chargés : {len(patient_ids)}")
 
-# Fonction pour charger les entrées infirmières depuis le CSV
-def load_nurse_inputs(patient_id):
+# Fonction pour initialiser la base des entrées infirmières (exécutée une fois par processus)
+# Les entrées déjà présentes dans le CSV ne sont importées que si la table est vide,
+# c'est-à-dire au premier démarrage : le CSV n'est pas reparcouru aux démarrages suivants
+@st.cache_resource
+def init_nurse_db(db_file):
+    conn = sqlite3.connect(db_file)
     try:
-        # Charger avec 'utf-8', sinon 'latin1'
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS nurse_inputs (
+                    ID TEXT PRIMARY KEY,
+                    objectives TEXT,
+                    tasks TEXT,
+                    comments TEXT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            nurse_columns = ["objectives", "tasks", "comments"]
+            is_empty = conn.execute("SELECT COUNT(*) FROM nurse_inputs").fetchone()[0] == 0
+            if is_empty and set(nurse_columns).issubset(final_data.columns):
+                existing = final_data[["ID"] + nurse_columns].fillna("")
+                existing = existing[(existing[nurse_columns] != "").any(axis=1)]
+                conn.executemany(
+                    "INSERT OR IGNORE INTO nurse_inputs (ID, objectives, tasks, comments) VALUES (?, ?, ?, ?)",
+                    existing.itertuples(index=False, name=None)
+                )
+    finally:
+        conn.close()
+
+# Créer la base des entrées infirmières si nécessaire
+init_nurse_db(nurse_db_file)
+
+# Fonction pour charger une seule fois toutes les entrées infirmières en mémoire
+# Le dictionnaire est partagé entre les sessions et mis à jour à chaque sauvegarde
+@st.cache_resource
+def load_nurse_store(db_file):
+    try:
+        conn = sqlite3.connect(db_file)
         try:
-            nurse_data = pd.read_csv(csv_file, dtype={'ID': str}, encoding='utf-8')
-        except UnicodeDecodeError:
-            logging.warning(f"Erreur d'encodage avec 'utf-8' lors du chargement des entrées infirmières. Tentative avec 'latin1'.")
-            nurse_data = pd.read_csv(csv_file, dtype={'ID': str}, encoding='latin1')
-        
-        row = nurse_data[nurse_data["ID"] == patient_id]
-        if not row.empty:
-            return row.iloc[0][["objectives", "tasks", "comments"]].fillna("")
-        else:
-            return {"objectives": "", "tasks": "", "comments": ""}
+            rows = conn.execute("SELECT ID, objectives, tasks, comments FROM nurse_inputs").fetchall()
+        finally:
+            conn.close()
+        return {
+            pid: {"objectives": objectives or "", "tasks": tasks or "", "comments": comments or ""}
+            for pid, objectives, tasks, comments in rows
+        }
     except Exception as e:
-        logging.error(f"Erreur lors du chargement des entrées infirmières depuis {csv_file}: {e}")
-        return {"objectives": "", "tasks": "", "comments": ""}
+        logging.error("Erreur lors du chargement des entrées infirmières depuis %s: %s", db_file, e)
+        return {}
 
-# Fonction pour sauvegarder les entrées infirmières dans le CSV
+nurse_inputs_store = load_nurse_store(nurse_db_file)
+
+# Fonction pour charger les entrées infirmières d'un patient
+def load_nurse_inputs(patient_id):
+    return dict(nurse_inputs_store.get(patient_id, {"objectives": "", "tasks": "", "comments": ""}))
+
+# Fonction pour sauvegarder les entrées infirmières (seule la ligne du patient est écrite)
 def save_nurse_inputs(patient_id, objectives, tasks, comments):
     try:
-        # Charger avec 'utf-8', sinon 'latin1'
+        conn = sqlite3.connect(nurse_db_file)
         try:
-            nurse_data = pd.read_csv(csv_file, dtype={'ID': str}, encoding='utf-8')
-        except UnicodeDecodeError:
-            logging.warning(f"Erreur d'encodage avec 'utf-8' lors du chargement des entrées infirmières pour sauvegarde. Tentative avec 'latin1'.")
-            nurse_data = pd.read_csv(csv_file, dtype={'ID': str}, encoding='latin1')
-        
-        if patient_id in nurse_data["ID"].values:
-            nurse_data.loc[nurse_data["ID"] == patient_id, ["objectives", "tasks", "comments"]] = [objectives, tasks, comments]
-        else:
-            new_entry = {"ID": patient_id, "objectives": objectives, "tasks": tasks, "comments": comments}
-            nurse_data = nurse_data.append(new_entry, ignore_index=True)
-        nurse_data.to_csv(csv_file, index=False, encoding='utf-8')  # Sauvegarder avec 'utf-8'
-        logging.debug(f"Entrées infirmières sauvegardées pour l'ID {patient_id}")
-        st.success("Entrées infirmières sauvegardées avec succès.")
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO nurse_inputs (ID, objectives, tasks, comments) VALUES (?, ?, ?, ?)",
+                    (patient_id, objectives, tasks, comments)
+                )
+        finally:
+            conn.close()
+        # Mettre à jour la copie en mémoire une fois l'écriture validée
+        nurse_inputs_store[patient_id] = {"objectives": objectives, "tasks": tasks, "comments": comments}
+        logging.debug("Entrées infirmières sauvegardées pour l'ID %s", patient_id)
+        return True
     except Exception as e:
-        logging.error(f"Erreur lors de la sauvegarde des entrées infirmières pour l'ID {patient_id}: {e}")
+        logging.error("Erreur lors de la sauvegarde des entrées infirmières pour l'ID %s: %s", patient_id, e)
         st.error("Erreur lors de la sauvegarde des entrées infirmières.")
+        return False
+
+# Sommes PID-5 par dimension pour tous les patients, calculées une seule fois dans des
+# matrices float32 contiguës (dimensions, patients) indexées par numéro de ligne du patient
+@st.cache_resource
+def load_pid5_dimension_sums(csv_file):
+    data = load_data(csv_file)
+    row_by_id = {pid: row for row, pid in enumerate(data.index)}
+    if not HAS_PID5_ALL:
+        return row_by_id, np.empty((0, len(data)), np.float32), np.empty((0, len(data)), np.float32)
+    # Matrice de sélection (items, dimensions) : toutes les dimensions de tous les patients
+    # en un seul produit matriciel (items manquants comptés comme 0, comme nansum)
+    selector = np.zeros((sum(len(cols) for cols in PID5_BL_COLS.values()), len(PID5_BL_COLS)), np.float32)
+    start = 0
+    for dim_idx, cols in enumerate(PID5_BL_COLS.values()):
+        selector[start:start + len(cols), dim_idx] = 1
+        start += len(cols)
+    bl_cols = [col for cols in PID5_BL_COLS.values() for col in cols]
+    fu_cols = [col for cols in PID5_FU_COLS.values() for col in cols]
+    pid5_bl_mat = (np.nan_to_num(data[bl_cols].to_numpy(np.float32)) @ selector).T.copy()
+    pid5_fu_mat = (np.nan_to_num(data[fu_cols].to_numpy(np.float32)) @ selector).T.copy()
+    return row_by_id, pid5_bl_mat, pid5_fu_mat
+
+pid5_row_by_id, pid5_bl_mat, pid5_fu_mat = load_pid5_dimension_sums(csv_file)
+
+# Totaux PHQ-9 par jour pour tous les patients : un tableau (patients, jours, items)
+# réduit une seule fois sur l'axe des items, puis indexé par ID
+@st.cache_resource
+def load_phq9_totals(csv_file):
+    data = load_data(csv_file)
+    if not HAS_PHQ9_ALL:
+        return {}
+    phq9_cols = [col for cols in PHQ9_DAY_COLS.values() for col in cols]
+    items = data[phq9_cols].to_numpy(dtype=np.float32).reshape(len(data), len(PHQ9_DAYS), -1)
+    return dict(zip(data.index, np.nansum(items, axis=2)))
+
+phq9_totals_by_id = load_phq9_totals(csv_file)
+
+# Scores MADRS par item au format long (Item, Score, Temps) pour tous les patients,
+# construits en une seule passe vectorisée puis regroupés par ID
+@st.cache_resource
+def load_madrs_long(csv_file):
+    data = load_data(csv_file)
+    if not MADRS_META:
+        return {}
+    madrs_long_all = pd.DataFrame({
+        "ID": np.repeat(data.index.to_numpy(), len(MADRS_META)),
+        "Item": [madrs_items_mapping.get(item) for _, item, _ in MADRS_META] * len(data),
+        "Score": data[MADRS_ITEM_COLS].to_numpy().ravel(),
+        "Temps": ["Baseline" if phase == 'bl' else "Jour 30" for _, _, phase in MADRS_META] * len(data)
+    }).dropna()
+    return {pid: group.drop(columns="ID") for pid, group in madrs_long_all.groupby("ID", sort=False)}
+
+madrs_long_by_id = load_madrs_long(csv_file)
+
+# Fonction pour obtenir les scores PID-5 par dimension (Baseline et Jour 30) d'un patient
+def compute_pid5_scores(patient_id):
+    row = pid5_row_by_id[patient_id]
+    return (dict(zip(PID5_BL_COLS, pid5_bl_mat[:, row].tolist())),
+            dict(zip(PID5_FU_COLS, pid5_fu_mat[:, row].tolist())))
+
+# Gabarits de figures construits une seule fois : seules les valeurs du patient sont
+# ensuite remplacées, sans repasser par la construction et la validation Plotly
+@st.cache_resource
+def madrs_total_template():
+    import plotly.graph_objects as go
+    # Deux barres : go.Bar directement, sans le pipeline de plotly.express (une trace par temps)
+    fig_madrs = go.Figure([
+        go.Bar(x=[temps], y=[0], name=temps, marker_color=color)
+        for temps, color in zip(["Baseline", "Jour 30"], PASTEL_COLORS)
+    ])
+    fig_madrs.update_layout(
+        title="Score Total MADRS",
+        xaxis_title="Temps",
+        yaxis_title="Score MADRS",
+        legend_title_text="Temps",
+        barmode="relative"  # Barres pleine largeur, comme avec px.bar
+    )
+    return fig_madrs.to_dict()
 
-# Fonction pour obtenir les entrées infirmières d'un patient
-def get_nurse_inputs(patient_id):
-    inputs = load_nurse_inputs(patient_id)
-    return inputs
+@st.cache_resource
+def pid5_spider_template():
+    import plotly.graph_objects as go
+    # Fermeture du graphique radar
+    categories = list(pid5_dimensions_mapping.keys())
+    categories += [categories[0]]
+
+    # Traces WebGL (Scatterpolargl), comme pour la progression PHQ-9
+    fig_spider = go.Figure()
+    fig_spider.add_trace(go.Scatterpolargl(
+        r=[],
+        theta=categories,
+        fill='toself',
+        name='Baseline',
+        line_color=PASTEL_COLORS[0]
+    ))
+    fig_spider.add_trace(go.Scatterpolargl(
+        r=[],
+        theta=categories,
+        fill='toself',
+        name='Jour 30',
+        line_color=PASTEL_COLORS[1]
+    ))
+    fig_spider.update_layout(
+        polar=dict(
+            radialaxis=dict(
+                visible=False,  # Suppression des étiquettes et ticks de l'axe radial
+                range=[0, 15]  # Limiter l'axe radial à 15
+            )
+        ),
+        showlegend=True,
+        title="Scores par Dimension PID-5",
+        template="plotly_white"
+    )
+    return fig_spider.to_dict()
+
+# Fonction pour remplir un gabarit avec une valeur d'attribut par trace (le gabarit n'est pas modifié)
+def fill_template(template, key, values_per_trace):
+    return {
+        "data": [dict(trace, **{key: values}) for trace, values in zip(template["data"], values_per_trace)],
+        "layout": template["layout"]
+    }
+
+# Constructeurs de graphiques mis en cache par patient : les figures ne sont
+# reconstruites que lorsque le patient sélectionné change, pas à chaque interaction
+# (le graphique PID-5 est partagé entre le tableau de bord et la page Détails PID-5)
+@st.cache_data(show_spinner=False)
+def build_madrs_total_fig(patient_id):
+    patient_data = final_data.loc[patient_id]
+    madrs_total = [patient_data.get("madrs_score_bl", 0), patient_data.get("madrs_score_fu", 0)]
+    # Une trace (barre) par temps
+    return fill_template(madrs_total_template(), "y", [[score] for score in madrs_total])
+
+@st.cache_data(show_spinner=False)
+def build_madrs_items_fig(patient_id):
+    madrs_long = madrs_long_by_id.get(patient_id)
+
+    # Aucun graphique si tous les scores sont manquants
+    if madrs_long is None:
+        return None
+
+    import plotly.express as px
+    fig = px.bar(
+        madrs_long,
+        x="Item",
+        y="Score",
+        color="Temps",
+        barmode="group",
+        title="Scores par Item MADRS",
+        template="plotly_white",
+        color_discrete_sequence=PASTEL_COLORS
+    )
+    fig.update_xaxes(tickangle=-45)
+    return fig.to_dict()
+
+@st.cache_data(show_spinner=False)
+def build_pid5_spider_fig(patient_id):
+    dimension_scores_bl, dimension_scores_fu = compute_pid5_scores(patient_id)
+    values_bl = list(dimension_scores_bl.values())
+    values_fu = list(dimension_scores_fu.values())
+
+    # Fermeture du graphique radar
+    values_bl += [values_bl[0]]
+    values_fu += [values_fu[0]]
+
+    return fill_template(pid5_spider_template(), "r", [values_bl, values_fu])
+
+@st.cache_data(show_spinner=False)
+def build_phq9_fig(patient_id):
+    import plotly.graph_objects as go
+    # Trace WebGL (Scattergl) : rendu GPU plutôt que SVG dans le navigateur
+    fig_phq9 = go.Figure(go.Scattergl(
+        x=[f'Jour {day}' for day in PHQ9_DAYS],
+        y=phq9_totals_by_id[patient_id],
+        mode='lines+markers',
+        line_color=PASTEL_COLORS[0]  # Utiliser une couleur pastel différente
+    ))
+    fig_phq9.update_layout(
+        title="Progression PHQ-9",
+        template="plotly_white",
+        xaxis_title="Jour",
+        yaxis_title="Score PHQ-9"
+    )
+    return fig_phq9.to_dict()
+
+# Fonction pour formater le revenu avec le symbole '$' et des virgules
+def format_revenu(revenu_bl):
+    return f"${revenu_bl:,}" if pd.notna(revenu_bl) and revenu_bl != 'N/A' else 'N/A'
+
+# Fonction pour construire un petit tableau Paramètre/Valeur affiché avec st.table ;
+# les valeurs sont converties en texte (colonne homogène, affichée telle quelle)
+def param_table(labels, values):
+    return pd.DataFrame({
+        "Paramètre": labels,
+        "Valeur": ['N/A' if pd.isna(value) else str(value) for value in values]
+    })
+
+# Tableau des données démographiques d'un patient, construit une seule fois par patient
+@st.cache_data(show_spinner=False)
+def demog_table(patient_id):
+    patient_data = final_data.loc[patient_id]
+    demog_labels = ["Sexe", "Âge", "Années d'éducation (Baseline)", "Revenu (Baseline)"]
+    demog_values = [
+        patient_data['sexe'],
+        patient_data['age'],
+        patient_data.get('annees_education_bl', 'N/A'),
+        format_revenu(patient_data.get('revenu_bl', 'N/A'))
+    ]
+    return param_table(demog_labels, demog_values)
+
+# Tableau des données cliniques d'un patient, construit une seule fois par patient
+@st.cache_data(show_spinner=False)
+def clin_table(patient_id):
+    patient_data = final_data.loc[patient_id]
+    clin_labels = ["Comorbidités", "Enceinte", "Cigarettes (Baseline)", "Alcool (Baseline)", "Cocaïne (Baseline)"]
+    clin_values = [
+        patient_data.get('comorbidities', 'N/A'),
+        patient_data.get('pregnant', 'N/A'),
+        patient_data.get('cigarette_bl', 'N/A'),
+        patient_data.get('alcool_bl', 'N/A'),
+        patient_data.get('cocaine_bl', 'N/A')
+    ]
+    return param_table(clin_labels, clin_values)
+
+# Formulaire des entrées infirmières isolé dans un fragment : la saisie ne relance que ce
+# bloc. Si la page affiche ces entrées ailleurs (refresh_app), une sauvegarde réussie relance
+# toute la page pour que l'aperçu reste cohérent (les graphiques viennent du cache).
+@st.fragment
+def nurse_form(patient_id, refresh_app=False):
+    nurse_inputs = load_nurse_inputs(patient_id)
+    with st.form(key='nursing_inputs_form'):
+        objectives_input = st.text_area("Objectifs SMART", height=100, value=nurse_inputs.get("objectives", ""))
+        tasks_input = st.text_area("Tâches d'Activation Comportementale", height=100, value=nurse_inputs.get("tasks", ""))
+        comments_input = st.text_area("Commentaires", height=100, value=nurse_inputs.get("comments", ""))
+        submit_button = st.form_submit_button(label='Sauvegarder')
+
+        if submit_button and save_nurse_inputs(patient_id, objectives_input, tasks_input, comments_input):
+            if refresh_app:
+                # Message de confirmation conservé à travers la réexécution complète
+                st.session_state['nurse_inputs_saved'] = True
+                st.rerun(scope="app")
+            st.success("Entrées infirmières sauvegardées avec succès.")
+            nurse_inputs = load_nurse_inputs(patient_id)
+        elif st.session_state.pop('nurse_inputs_saved', False):
+            st.success("Entrées infirmières sauvegardées avec succès.")
+
+    st.markdown("---")
+
+    # Afficher les Entrées Infirmières Sauvegardées
+    st.subheader("Entrées Infirmières Sauvegardées")
+    objectives = nurse_inputs.get("objectives", "")
+    tasks = nurse_inputs.get("tasks", "")
+    comments = nurse_inputs.get("comments", "")
+    if objectives or tasks or comments:
+        st.write(f"**Objectifs :** {objectives if objectives else 'N/A'}")
+        st.write(f"**Tâches :** {tasks if tasks else 'N/A'}")
+        st.write(f"**Commentaires :** {comments if comments else 'N/A'}")
+    else:
+        st.write("Aucune entrée sauvegardée.")
 
 # Page "Tableau de Bord du Patient"
 def patient_dashboard():
@@ -283,7 +707,7 @@ def patient_dashboard():
         st.warning("Aucun patient sélectionné.")
         return
 
-    patient_data = final_data[final_data["ID"] == selected_patient_id].iloc[0]
+    patient_data = final_data.loc[selected_patient_id]
 
     # Aperçu du Patient et Objectifs SMART
     st.header("Aperçu du Patient")
@@ -293,24 +717,16 @@ def patient_dashboard():
         with col1:
             st.subheader("Informations du Patient")
             st.write(f"**Âge :** {patient_data['age']}")
-            sex_numeric = patient_data['sexe']
-            # Correction de l'affichage de "Sexe"
-            sex = "Homme" if sex_numeric == '1' else "Femme" if sex_numeric == '2' else "Autre"
-            st.write(f"**Sexe :** {sex}")
+            st.write(f"**Sexe :** {patient_data['sexe']}")
             education_years = patient_data.get('annees_education_bl', 'N/A')
             st.write(f"**Années d'éducation (Baseline) :** {education_years}")
-            revenu_bl = patient_data.get('revenu_bl', 'N/A')
             # Ajout du symbole '$' devant le revenu et formatage avec des virgules
-            try:
-                revenu_int = int(revenu_bl)
-                revenu_formate = f"${revenu_int:,}"
-            except:
-                revenu_formate = f"${revenu_bl}" if revenu_bl != 'N/A' else 'N/A'
+            revenu_formate = format_revenu(patient_data.get('revenu_bl', 'N/A'))
             st.write(f"**Revenu (Baseline) :** {revenu_formate}")
         with col2:
             st.subheader("Objectifs SMART")
             # Charger les entrées infirmières pour ce patient
-            nurse_inputs = get_nurse_inputs(selected_patient_id)
+            nurse_inputs = load_nurse_inputs(selected_patient_id)
             objectives = nurse_inputs.get("objectives", "N/A")
             tasks = nurse_inputs.get("tasks", "N/A")
             comments = nurse_inputs.get("comments", "N/A")
@@ -326,41 +742,10 @@ def patient_dashboard():
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Données Démographiques")
-            demog_labels = ["Sexe", "Âge", "Années d'éducation (Baseline)", "Revenu (Baseline)"]
-            demog_values = [
-                sex,
-                patient_data['age'],
-                education_years,
-                revenu_formate
-            ]
-            demog_df = pd.DataFrame({
-                "Paramètre": demog_labels,
-                "Valeur": demog_values
-            })
-            st.table(demog_df)
+            st.table(demog_table(selected_patient_id))
         with col2:
             st.subheader("Données Cliniques")
-            clin_labels = ["Comorbidités", "Enceinte", "Cigarettes (Baseline)", "Alcool (Baseline)", "Cocaïne (Baseline)"]
-            # Correction de l'affichage de "Enceinte"
-            pregnant_val = patient_data.get('pregnant', 'N/A')
-            if pregnant_val == '1':
-                pregnant_display = "Oui"
-            elif pregnant_val == '0':
-                pregnant_display = "Non"
-            else:
-                pregnant_display = "N/A"
-            clin_values = [
-                patient_data.get('comorbidities', 'N/A'),
-                pregnant_display,
-                patient_data.get('cigarette_bl', 'N/A'),
-                patient_data.get('alcool_bl', 'N/A'),
-                patient_data.get('cocaine_bl', 'N/A')
-            ]
-            clin_df = pd.DataFrame({
-                "Paramètre": clin_labels,
-                "Valeur": clin_values
-            })
-            st.table(clin_df)
+            st.table(clin_table(selected_patient_id))
 
     st.markdown("---")
 
@@ -370,48 +755,17 @@ def patient_dashboard():
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Score Total MADRS")
-            madrs_total = {
-                "Baseline": patient_data.get("madrs_score_bl", 0),
-                "Jour 30": patient_data.get("madrs_score_fu", 0)
-            }
-            fig_madrs = px.bar(
-                x=list(madrs_total.keys()),
-                y=list(madrs_total.values()),
-                labels={"x": "Temps", "y": "Score MADRS"},
-                color=list(madrs_total.keys()),
-                color_discrete_sequence=PASTEL_COLORS,
-                title="Score Total MADRS"
-            )
-            st.plotly_chart(fig_madrs, use_container_width=True)
+            st.plotly_chart(build_madrs_total_fig(selected_patient_id), use_container_width=True)
         with col2:
             st.subheader("Scores par Item MADRS")
-            madrs_items = patient_data.filter(regex=r"^madrs[_.]\d+[_.](bl|fu)$")
-            if madrs_items.empty:
+            if not MADRS_ITEM_COLS:
                 st.warning("Aucun score par item MADRS trouvé pour ce patient.")
             else:
-                madrs_items_df = madrs_items.to_frame().T
-                madrs_long = madrs_items_df.melt(var_name="Item", value_name="Score").dropna()
-                madrs_long["Temps"] = madrs_long["Item"].str.extract("_(bl|fu)$")[0]
-                madrs_long["Temps"] = madrs_long["Temps"].map({"bl": "Baseline", "fu": "Jour 30"})
-                madrs_long["Item"] = madrs_long["Item"].str.extract(r"madrs[_.](\d+)_")[0].astype(int)
-                madrs_long["Item"] = madrs_long["Item"].map(madrs_items_mapping)
-                madrs_long.dropna(subset=["Item"], inplace=True)
-
-                if madrs_long.empty:
+                fig_madrs_items = build_madrs_items_fig(selected_patient_id)
+                if fig_madrs_items is None:
                     st.warning("Tous les scores par item MADRS sont NaN.")
                 else:
-                    fig = px.bar(
-                        madrs_long,
-                        x="Item",
-                        y="Score",
-                        color="Temps",
-                        barmode="group",
-                        title="Scores par Item MADRS",
-                        template="plotly_white",
-                        color_discrete_sequence=PASTEL_COLORS
-                    )
-                    fig.update_xaxes(tickangle=-45)
-                    st.plotly_chart(fig, use_container_width=True)
+                    st.plotly_chart(fig_madrs_items, use_container_width=True)
 
     st.markdown("---")
 
@@ -422,90 +776,19 @@ def patient_dashboard():
         with col1:
             if has_pid5:
                 st.subheader("Scores PID-5")
-                pid5_columns_bl = []
-                pid5_columns_fu = []
-                for dimension, items in pid5_dimensions_mapping.items():
-                    pid5_columns_bl += [f'pid5_{item}_bl' for item in items]
-                    pid5_columns_fu += [f'pid5_{item}_fu' for item in items]
-
-                if not set(pid5_columns_bl + pid5_columns_fu).issubset(final_data.columns):
+                if not HAS_PID5_ALL:
                     st.warning("Données PID-5 incomplètes pour ce patient.")
                 else:
-                    dimension_scores_bl = {}
-                    dimension_scores_fu = {}
-                    for dimension, items in pid5_dimensions_mapping.items():
-                        baseline_score = patient_data[[f'pid5_{item}_bl' for item in items]].sum()
-                        followup_score = patient_data[[f'pid5_{item}_fu' for item in items]].sum()
-                        dimension_scores_bl[dimension] = baseline_score.sum()
-                        dimension_scores_fu[dimension] = followup_score.sum()
-
-                    categories = list(pid5_dimensions_mapping.keys())
-                    values_bl = list(dimension_scores_bl.values())
-                    values_fu = list(dimension_scores_fu.values())
-
-                    # Fermeture du graphique radar
-                    categories += [categories[0]]
-                    values_bl += [values_bl[0]]
-                    values_fu += [values_fu[0]]
-
-                    fig_spider = go.Figure()
-                    fig_spider.add_trace(go.Scatterpolar(
-                        r=values_bl,
-                        theta=categories,
-                        fill='toself',
-                        name='Baseline',
-                        line_color=PASTEL_COLORS[0]
-                    ))
-                    fig_spider.add_trace(go.Scatterpolar(
-                        r=values_fu,
-                        theta=categories,
-                        fill='toself',
-                        name='Jour 30',
-                        line_color=PASTEL_COLORS[1]
-                    ))
-                    fig_spider.update_layout(
-                        polar=dict(
-                            radialaxis=dict(
-                                visible=False,  # Suppression des étiquettes et ticks de l'axe radial
-                                range=[0, 15]  # Limiter l'axe radial à 15
-                            )
-                        ),
-                        showlegend=True,
-                        title="Scores par Dimension PID-5",
-                        template="plotly_white"
-                    )
-                    st.plotly_chart(fig_spider, use_container_width=True)
+                    st.plotly_chart(build_pid5_spider_fig(selected_patient_id), use_container_width=True)
             else:
                 st.info("Les données PID-5 ne sont pas disponibles.")
         with col2:
             if has_phq9:
                 st.subheader("Progression PHQ-9")
-                phq9_days = [5, 10, 15, 20, 25, 30]
-                phq9_scores = {}
-                missing_phq9 = False
-                for day in phq9_days:
-                    item_columns = [f'phq9_day{day}_item{item}' for item in range(1, 10)]
-                    if not set(item_columns).issubset(final_data.columns):
-                        missing_phq9 = True
-                        break
-                    phq9_score = patient_data[item_columns].sum()
-                    phq9_scores[f'Jour {day}'] = phq9_score
-
-                if missing_phq9:
+                if not HAS_PHQ9_ALL:
                     st.warning("Données PHQ-9 incomplètes pour ce patient.")
                 else:
-                    phq9_df = pd.DataFrame(list(phq9_scores.items()), columns=["Jour", "Score"])
-                    fig_phq9 = px.line(
-                        phq9_df,
-                        x="Jour",
-                        y="Score",
-                        markers=True,
-                        title="Progression PHQ-9",
-                        template="plotly_white",
-                        color_discrete_sequence=[PASTEL_COLORS[0]]  # Utiliser une couleur pastel différente
-                    )
-                    fig_phq9.update_layout(xaxis_title="Jour", yaxis_title="Score PHQ-9")
-                    st.plotly_chart(fig_phq9, use_container_width=True)
+                    st.plotly_chart(build_phq9_fig(selected_patient_id), use_container_width=True)
             else:
                 st.info("Les données PHQ-9 ne sont pas disponibles.")
 
@@ -513,25 +796,7 @@ def patient_dashboard():
 
     # Entrées Infirmières
     st.header("Entrées Infirmières")
-    with st.form(key='nursing_inputs_form'):
-        objectives_input = st.text_area("Objectifs SMART", height=100, value=objectives)
-        tasks_input = st.text_area("Tâches d'Activation Comportementale", height=100, value=tasks)
-        comments_input = st.text_area("Commentaires", height=100, value=comments)
-        submit_button = st.form_submit_button(label='Sauvegarder')
-
-        if submit_button:
-            save_nurse_inputs(selected_patient_id, objectives_input, tasks_input, comments_input)
-
-    st.markdown("---")
-
-    # Afficher les Entrées Infirmières Sauvegardées
-    st.subheader("Entrées Infirmières Sauvegardées")
-    if objectives or tasks or comments:
-        st.write(f"**Objectifs :** {objectives if objectives else 'N/A'}")
-        st.write(f"**Tâches :** {tasks if tasks else 'N/A'}")
-        st.write(f"**Commentaires :** {comments if comments else 'N/A'}")
-    else:
-        st.write("Aucune entrée sauvegardée.")
+    nurse_form(selected_patient_id, refresh_app=True)
 
 # Page "Entrées Infirmières"
 def nurse_inputs_page():
@@ -540,26 +805,7 @@ def nurse_inputs_page():
         return
 
     st.header("Entrées Infirmières")
-    nurse_inputs = get_nurse_inputs(selected_patient_id)
-    with st.form(key='nursing_inputs_form'):
-        objectives_input = st.text_area("Objectifs SMART", height=100, value=nurse_inputs.get("objectives", ""))
-        tasks_input = st.text_area("Tâches d'Activation Comportementale", height=100, value=nurse_inputs.get("tasks", ""))
-        comments_input = st.text_area("Commentaires", height=100, value=nurse_inputs.get("comments", ""))
-        submit_button = st.form_submit_button(label='Sauvegarder')
-
-        if submit_button:
-            save_nurse_inputs(selected_patient_id, objectives_input, tasks_input, comments_input)
-
-    st.markdown("---")
-
-    # Afficher les Entrées Infirmières Sauvegardées
-    st.subheader("Entrées Infirmières Sauvegardées")
-    if nurse_inputs:
-        st.write(f"**Objectifs :** {nurse_inputs.get('objectives', 'N/A')}")
-        st.write(f"**Tâches :** {nurse_inputs.get('tasks', 'N/A')}")
-        st.write(f"**Commentaires :** {nurse_inputs.get('comments', 'N/A')}")
-    else:
-        st.write("Aucune entrée sauvegardée.")
+    nurse_form(selected_patient_id)
 
 # Page "Détails PID-5"
 def details_pid5_page():
@@ -571,31 +817,19 @@ def details_pid5_page():
         st.info("Les données PID-5 ne sont pas disponibles.")
         return
 
-    patient_data = final_data[final_data["ID"] == selected_patient_id].iloc[0]
-
-    pid5_columns = []
-    for dimension, items in pid5_dimensions_mapping.items():
-        pid5_columns += [f'pid5_{item}_bl' for item in items] + [f'pid5_{item}_fu' for item in items]
-
-    if not set(pid5_columns).issubset(final_data.columns):
+    if not HAS_PID5_ALL:
         st.warning("Données PID-5 incomplètes pour ce patient.")
         return
 
-    dimension_scores_bl = {}
-    dimension_scores_fu = {}
-    for dimension, items in pid5_dimensions_mapping.items():
-        baseline_score = patient_data[[f'pid5_{item}_bl' for item in items]].sum()
-        followup_score = patient_data[[f'pid5_{item}_fu' for item in items]].sum()
-        dimension_scores_bl[dimension] = baseline_score.sum()
-        dimension_scores_fu[dimension] = followup_score.sum()
+    dimension_scores_bl, dimension_scores_fu = compute_pid5_scores(selected_patient_id)
 
     # Préparer les données pour le tableau
     table_data = []
     for dimension in pid5_dimensions_mapping.keys():
         table_data.append({
             "Domaine": dimension,
-            "Total Baseline": f"{dimension_scores_bl[dimension]:,}",
-            "Total Jour 30": f"{dimension_scores_fu[dimension]:,}"
+            "Total Baseline": f"{dimension_scores_bl[dimension]:,g}",
+            "Total Jour 30": f"{dimension_scores_fu[dimension]:,g}"
         })
 
     pid5_df = pd.DataFrame(table_data)
@@ -603,43 +837,8 @@ def details_pid5_page():
     st.subheader("Scores PID-5 par Domaine")
     st.table(pid5_df)
 
-    # Créer le graphique en araignée (spider plot) sans ligne de référence
-    categories = list(pid5_dimensions_mapping.keys())
-    values_bl = list(dimension_scores_bl.values())
-    values_fu = list(dimension_scores_fu.values())
-
-    # Fermeture du graphique radar
-    categories += [categories[0]]
-    values_bl += [values_bl[0]]
-    values_fu += [values_fu[0]]
-
-    fig_spider = go.Figure()
-    fig_spider.add_trace(go.Scatterpolar(
-        r=values_bl,
-        theta=categories,
-        fill='toself',
-        name='Baseline',
-        line_color=PASTEL_COLORS[0]
-    ))
-    fig_spider.add_trace(go.Scatterpolar(
-        r=values_fu,
-        theta=categories,
-        fill='toself',
-        name='Jour 30',
-        line_color=PASTEL_COLORS[1]
-    ))
-    fig_spider.update_layout(
-        polar=dict(
-            radialaxis=dict(
-                visible=False,  # Suppression des étiquettes et ticks de l'axe radial
-                range=[0, 15]   # Limiter l'axe radial à 15
-            )
-        ),
-        showlegend=True,
-        title="Scores par Dimension PID-5",
-        template="plotly_white"
-    )
-    st.plotly_chart(fig_spider, use_container_width=True)
+    # Graphique en araignée (spider plot) sans ligne de référence, partagé avec le tableau de bord
+    st.plotly_chart(build_pid5_spider_fig(selected_patient_id), use_container_width=True)
 
 # Logique principale de l'application
 if page == "Tableau de Bord du Patient":